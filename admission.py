@@ -0,0 +1,213 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+
+from fastapi.responses import JSONResponse
+
+# HTTP methods that write to the database and go through admission control
+WRITE_METHODS = {"POST", "PUT", "DELETE"}
+
+# Tokens added to each client's bucket per second (sustained writes per second)
+WRITE_RATE = float(os.environ.get("HABIT_TRACKER_WRITE_RATE", 5))
+
+# Maximum number of tokens in a bucket (writes a client may burst at once)
+WRITE_BURST = int(os.environ.get("HABIT_TRACKER_WRITE_BURST", 20))
+
+# Maximum number of write requests handled at the same time
+# SQLite has a single writer, so more than a couple only adds lock contention
+WRITE_CONCURRENCY = int(os.environ.get("HABIT_TRACKER_WRITE_CONCURRENCY", 2))
+
+# Maximum number of write requests waiting for a slot before new ones are rejected immediately
+WRITE_QUEUE_LIMIT = int(os.environ.get("HABIT_TRACKER_WRITE_QUEUE_LIMIT", 32))
+
+# Maximum seconds a write request waits for a slot before it is rejected
+WRITE_QUEUE_TIMEOUT = float(os.environ.get("HABIT_TRACKER_WRITE_QUEUE_TIMEOUT", 0.5))
+
+# Seconds clients are told to wait when the writer is saturated
+SATURATED_RETRY_AFTER = 1
+
+# Number of client buckets kept before the least recently used one is evicted
+MAX_BUCKETS = 10000
+
+# Number of recent queue times kept for percentile metrics
+QUEUE_TIME_SAMPLES = 1024
+
+# =====================
+# Token Bucket
+# =====================
+
+class TokenBucket:
+    """
+       Limits the rate of requests from a single client.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate  # Tokens added per second
+        self.capacity = capacity  # Maximum number of tokens
+        self.tokens = capacity  # Tokens currently available
+        self.updated = time.monotonic()  # Last time tokens were added
+
+    def take(self):
+        """
+            Takes a token from the bucket if one is available.
+            Returns:
+                float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+# =====================
+# Admission Controller
+# =====================
+
+class AdmissionController:
+    """
+       Rate limits write requests per client and bounds how many run concurrently.
+       All methods run on the event loop, so the state needs no locking.
+    """
+    def __init__(self, rate=WRITE_RATE, burst=WRITE_BURST, concurrency=WRITE_CONCURRENCY,
+                 queue_limit=WRITE_QUEUE_LIMIT, queue_timeout=WRITE_QUEUE_TIMEOUT):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.buckets = OrderedDict()  # Client address -> TokenBucket, least recently used first
+        self.slots = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.saturated = 0
+        self.queue_times = deque(maxlen=QUEUE_TIME_SAMPLES)
+        self.max_queue_time = 0.0
+
+    def _bucket(self, client):
+        """
+            Retrieves the token bucket for a client, creating it if needed.
+            Args:
+                client (str): The client address.
+            Returns:
+                TokenBucket: The client's bucket.
+        """
+        bucket = self.buckets.get(client)
+        if bucket is not None:
+            self.buckets.move_to_end(client)
+            return bucket
+        if len(self.buckets) >= MAX_BUCKETS:
+            self.buckets.popitem(last=False)
+        bucket = self.buckets[client] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def admit(self, scope, receive, send, app):
+        """
+            Runs a write request if the client is within its rate and a write slot frees up in time,
+            otherwise sends a 429/503 rejection with Retry-After.
+            Args:
+                scope (dict): The ASGI connection scope.
+                receive (callable): The ASGI receive channel.
+                send (callable): The ASGI send channel.
+                app (callable): The ASGI application that handles admitted requests.
+        """
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        retry_after = self._bucket(client).take()
+        if retry_after:
+            self.rate_limited += 1
+            await _reject(429, "Too many write requests", retry_after)(scope, receive, send)
+            return
+
+        # Shed load immediately instead of letting requests pile up behind the writer
+        if self.queued >= self.queue_limit:
+            self.saturated += 1
+            await _reject(503, "Write queue is full", SATURATED_RETRY_AFTER)(scope, receive, send)
+            return
+
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.saturated += 1
+            await _reject(503, "Writer is saturated", SATURATED_RETRY_AFTER)(scope, receive, send)
+            return
+        finally:
+            self.queued -= 1
+
+        queue_time = time.monotonic() - started
+        self.queue_times.append(queue_time)
+        self.max_queue_time = max(self.max_queue_time, queue_time)
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            await app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+    def metrics(self):
+        """
+            Retrieves admission counters and queue time statistics.
+            Returns:
+                dict: Admission metrics, with queue times in milliseconds.
+        """
+        samples = sorted(self.queue_times)
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3) if samples else 0.0
+
+        return {
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rate_limited,
+            "rejected_saturated": self.saturated,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "concurrency_limit": self.concurrency,
+            "tracked_clients": len(self.buckets),
+            "queue_time_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(self.max_queue_time * 1000, 3),
+            },
+        }
+
+# Build a rejection response with a Retry-After header
+def _reject(status_code, detail, retry_after):
+    """
+        Builds a rejection response in the same shape as HTTPException errors.
+        Args:
+            status_code (int): 429 for rate limiting or 503 for saturation.
+            detail (str): The error message.
+            retry_after (float): Seconds the client should wait before retrying.
+        Returns:
+            JSONResponse: The rejection response.
+    """
+    # Retry-After only accepts whole seconds
+    return JSONResponse(status_code=status_code, content={"detail": detail},
+                        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))})
+
+# Shared controller used by the application middleware
+controller = AdmissionController()
+
+# =====================
+# ASGI Middleware
+# =====================
+
+class AdmissionMiddleware:
+    """
+       ASGI middleware that sends write requests under /api through the admission controller.
+       Every other request, including long-lived change streams, is passed straight to the app.
+    """
+    def __init__(self, app):
+        self.app = app  # The wrapped ASGI application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS or not scope["path"].startswith("/api"):
+            await self.app(scope, receive, send)
+            return
+        await controller.admit(scope, receive, send, self.app)
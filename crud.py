@@ -1,5 +1,71 @@
 from database import get_connection
+from replica import get_read_connection
 from datetime import date
+import json
+import notifier
+
+# Number of days a change log entry is kept before it is compacted away
+CHANGES_RETENTION_DAYS = 30
+
+# Compact the change log opportunistically every N logged changes
+CHANGES_COMPACT_EVERY = 1000
+
+# Number of days a sync idempotency key is remembered; replays older than this are applied again
+SYNC_KEYS_RETENTION_DAYS = 30
+
+# Number of days a synced record may be dated after the server's current date, to allow for clock skew
+SYNC_MAX_CLOCK_SKEW_DAYS = 1
+
+# =====================
+# Change Log
+# =====================
+
+# Append a change to the change log
+def _log_change(cursor, entity, entity_id, op):
+    """
+        Appends an entry to the changes table within the caller's transaction.
+        Args:
+            cursor (sqlite3.Cursor): The cursor of the transaction that performed the write.
+            entity (str): The kind of row that changed ('habit' or 'record').
+            entity_id (int): The ID of the row that changed.
+            op (str): The kind of change ('insert', 'update' or 'delete').
+    """
+    data = None
+    if op != "delete":
+        # Snapshot the row as written so clients can apply the change without another request
+        table = "habits" if entity == "habit" else "habit_records"
+        cursor.execute(f"SELECT * FROM {table} WHERE id = ?", (entity_id,))
+        row = cursor.fetchone()
+        data = json.dumps(dict(row)) if row else None
+
+    cursor.execute("""
+        INSERT INTO changes (entity, entity_id, op, data)
+        VALUES (?, ?, ?, ?)
+    """, (entity, entity_id, op, data))
+
+    # Periodically drop entries older than the retention window
+    if cursor.lastrowid % CHANGES_COMPACT_EVERY == 0:
+        _compact_changes(cursor, CHANGES_RETENTION_DAYS)
+
+# Delete change log entries and sync keys older than their retention windows
+def _compact_changes(cursor, retention_days):
+    """
+        Deletes change log entries older than the retention window, and sync
+        idempotency keys older than SYNC_KEYS_RETENTION_DAYS.
+        Args:
+            cursor (sqlite3.Cursor): The cursor to run the deletion on.
+            retention_days (int): The number of days of changes to keep.
+        Returns:
+            int: The number of deleted change log entries.
+    """
+    cursor.execute("""
+        DELETE FROM changes WHERE changed_at < DATETIME('now', ?)
+    """, (f"-{int(retention_days)} days",))
+    deleted = cursor.rowcount
+    cursor.execute("""
+        DELETE FROM sync_keys WHERE applied_at < DATETIME('now', ?)
+    """, (f"-{int(SYNC_KEYS_RETENTION_DAYS)} days",))
+    return deleted
 
 # =====================
 # CRUD for Habits
@@ -22,9 +88,11 @@ def create_habit(name, description, frequency):
         INSERT INTO habits (name, description, frequency) 
         VALUES (?, ?, ?)
     """, (name, description, frequency))
-    conn.commit()
     habit_id = cursor.lastrowid
+    _log_change(cursor, "habit", habit_id, "insert")
+    conn.commit()
     conn.close()
+    notifier.notify()
     return habit_id
 
 # Retrieve all habits
@@ -34,7 +102,7 @@ def get_all_habits():
         Returns:
             list: A list of dictionaries containing habit details.
     """
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM habits")
     habits = cursor.fetchall()
@@ -86,8 +154,11 @@ def update_habit(habit_id, name=None, description=None, frequency=None):
     params.append(habit_id)
     query = f"UPDATE habits SET {', '.join(fields)} WHERE id = ?"
     cursor.execute(query, tuple(params))
+    if cursor.rowcount:
+        _log_change(cursor, "habit", habit_id, "update")
     conn.commit()
     conn.close()
+    notifier.notify()
 
 # Delete a habit
 def delete_habit(habit_id):
@@ -99,8 +170,11 @@ def delete_habit(habit_id):
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM habits WHERE id = ?", (habit_id,))
+    if cursor.rowcount:
+        _log_change(cursor, "habit", habit_id, "delete")
     conn.commit()
     conn.close()
+    notifier.notify()
 
 # Retrieve habits by frequency
 def get_habits_by_frequency(frequency):
@@ -137,10 +211,10 @@ def create_record(habit_id, status):
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Retrieve the most recent record for the habit to calculate streaks
+    # Retrieve the most recent record up to today for the habit to calculate streaks
     cursor.execute("""
         SELECT current_streak, longest_streak FROM habit_records
-        WHERE habit_id = ? ORDER BY date DESC LIMIT 1
+        WHERE habit_id = ? AND date <= DATE('now') ORDER BY date DESC, id DESC LIMIT 1
     """, (habit_id,))
     last_record = cursor.fetchone()
 
@@ -163,9 +237,21 @@ def create_record(habit_id, status):
         INSERT INTO habit_records (habit_id, date, status, current_streak, longest_streak)
         VALUES (?, DATE('now'), ?, ?, ?)
     """, (habit_id, status, current_streak, longest_streak))
-    conn.commit()
     record_id = cursor.lastrowid
+    _log_change(cursor, "record", record_id, "insert")
+
+    # Records synced with a date after today (clock skew) now follow this one
+    cursor.execute("""
+        SELECT MIN(date) AS next_date FROM habit_records
+        WHERE habit_id = ? AND date > DATE('now')
+    """, (habit_id,))
+    next_date = cursor.fetchone()["next_date"]
+    if next_date:
+        for updated_id in _recalculate_streaks(cursor, habit_id, next_date):
+            _log_change(cursor, "record", updated_id, "update")
+    conn.commit()
     conn.close()
+    notifier.notify()
     return record_id
 
 # Retrieve all habit records
@@ -175,7 +261,7 @@ def get_all_records():
         Returns:
             list: A list of dictionaries containing all habit records.
     """
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT * FROM habit_records
@@ -234,9 +320,9 @@ def update_record(record_id, status):
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Retrieve the current streak and habit ID for the record
+    # Retrieve the habit ID and date of the record
     cursor.execute("""
-        SELECT habit_id, current_streak, longest_streak FROM habit_records WHERE id = ?
+        SELECT habit_id, date FROM habit_records WHERE id = ?
     """, (record_id,))
     record = cursor.fetchone()
 
@@ -244,23 +330,19 @@ def update_record(record_id, status):
         conn.close()
         raise ValueError("Record not found")
 
-    habit_id, current_streak, longest_streak = record
+    habit_id, record_date = record
 
-    # Recalculate streaks based on the new status
-    if status == "completed":
-        current_streak += 1
-        longest_streak = max(current_streak, longest_streak)
-    else:
-        current_streak = 0
-
-    # Update the record in the database
+    # Update the record, then recalculate streaks from its date since later records build on it
     cursor.execute("""
-        UPDATE habit_records
-        SET status = ?, current_streak = ?, longest_streak = ?
-        WHERE id = ?
-    """, (status, current_streak, longest_streak, record_id))
+        UPDATE habit_records SET status = ? WHERE id = ?
+    """, (status, record_id))
+    updated_ids = set(_recalculate_streaks(cursor, habit_id, record_date))
+    updated_ids.add(record_id)
+    for updated_id in sorted(updated_ids):
+        _log_change(cursor, "record", updated_id, "update")
     conn.commit()
     conn.close()
+    notifier.notify()
 
 # Retrieve the longest streak across all habits
 def get_longest_run_streak_all():
@@ -269,7 +351,7 @@ def get_longest_run_streak_all():
         Returns:
             int: The longest streak value, or 0 if no records exist.
     """
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT MAX(longest_streak) AS longest_streak FROM habit_records
@@ -289,7 +371,7 @@ def get_longest_run_streak_by_habit(habit_id):
         Returns:
             int: The longest streak value, or 0 if no records exist for the habit.
     """
-    conn = get_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT MAX(longest_streak) AS longest_streak FROM habit_records
@@ -301,12 +383,233 @@ def get_longest_run_streak_by_habit(habit_id):
     # Return the longest streak or 0 if no records are found
     return result["longest_streak"] if result and result["longest_streak"] is not None else 0
 
+# Recalculate streaks for a habit from a given date onward
+def _recalculate_streaks(cursor, habit_id, from_date):
+    """
+        Recomputes current and longest streaks for the records of a habit dated on or after `from_date`.
+        Streaks are carried over from the last record before `from_date`, so records inserted
+        out of order only cost a pass over the affected range.
+        Args:
+            cursor (sqlite3.Cursor): The cursor of the transaction that changed the records.
+            habit_id (int): The ID of the habit to recalculate.
+            from_date (str): The earliest changed date (YYYY-MM-DD).
+        Returns:
+            list: The IDs of the records whose streaks changed.
+    """
+    cursor.execute("""
+        SELECT current_streak, longest_streak FROM habit_records
+        WHERE habit_id = ? AND date < ? ORDER BY date DESC, id DESC LIMIT 1
+    """, (habit_id, from_date))
+    previous = cursor.fetchone()
+    current_streak, longest_streak = (previous["current_streak"], previous["longest_streak"]) if previous else (0, 0)
+
+    cursor.execute("""
+        SELECT id, status, current_streak, longest_streak FROM habit_records
+        WHERE habit_id = ? AND date >= ? ORDER BY date, id
+    """, (habit_id, from_date))
+    records = cursor.fetchall()
+
+    updates = []
+    for record in records:
+        if record["status"] == "completed":
+            current_streak += 1
+            longest_streak = max(current_streak, longest_streak)
+        else:
+            current_streak = 0
+        if (record["current_streak"], record["longest_streak"]) != (current_streak, longest_streak):
+            updates.append((current_streak, longest_streak, record["id"]))
+
+    cursor.executemany("""
+        UPDATE habit_records SET current_streak = ?, longest_streak = ? WHERE id = ?
+    """, updates)
+    return [record_id for _, _, record_id in updates]
+
+# Apply a batch of records uploaded by an offline client
+def sync_records(records):
+    """
+        Applies a batch of client-side records in a single transaction.
+        Records are deduplicated by idempotency key and by (habit_id, date). When a record
+        already exists for the same habit and date, 'completed' wins over 'missed', so the
+        outcome does not depend on the order in which clients upload. Records dated more than
+        SYNC_MAX_CLOCK_SKEW_DAYS after the server's current date are rejected.
+        Streaks are recalculated once per affected habit, starting from its earliest changed date.
+        Args:
+            records (list): Dictionaries with 'habit_id', 'date' (YYYY-MM-DD), 'status'
+                and an optional 'idempotency_key'.
+        Returns:
+            list: One result dictionary per record, in input order, with a 'result' of
+                'inserted', 'updated', 'unchanged', 'duplicate' or 'rejected'.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    # Take the write lock up front so the dedup reads and the writes see the same state
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("SELECT DATE('now', ?) AS latest_date", (f"+{int(SYNC_MAX_CLOCK_SKEW_DAYS)} days",))
+    latest_date = cursor.fetchone()["latest_date"]
+
+    results = []
+    inserted_ids = []
+    updated_ids = set()
+    affected = {}  # habit_id -> earliest changed date
+    known_habits = {}
+
+    for record in records:
+        habit_id, record_date, status = record["habit_id"], record["date"], record["status"]
+        key = record.get("idempotency_key")
+        result = {"idempotency_key": key, "habit_id": habit_id, "date": record_date, "record_id": None}
+        results.append(result)
+
+        if key:
+            cursor.execute("SELECT record_id FROM sync_keys WHERE idempotency_key = ?", (key,))
+            seen = cursor.fetchone()
+            if seen:
+                result.update(result="duplicate", record_id=seen["record_id"])
+                continue
+
+        if habit_id not in known_habits:
+            cursor.execute("SELECT 1 FROM habits WHERE id = ?", (habit_id,))
+            known_habits[habit_id] = cursor.fetchone() is not None
+        if not known_habits[habit_id] or status not in ("completed", "missed") or record_date > latest_date:
+            result["result"] = "rejected"
+            continue
+
+        cursor.execute("""
+            SELECT id, status FROM habit_records
+            WHERE habit_id = ? AND date = ? ORDER BY id LIMIT 1
+        """, (habit_id, record_date))
+        existing = cursor.fetchone()
+
+        if existing:
+            record_id = existing["id"]
+            if existing["status"] == "missed" and status == "completed":
+                cursor.execute("UPDATE habit_records SET status = ? WHERE id = ?", (status, record_id))
+                updated_ids.add(record_id)
+                result["result"] = "updated"
+            else:
+                result["result"] = "unchanged"
+        else:
+            cursor.execute("""
+                INSERT INTO habit_records (habit_id, date, status, current_streak, longest_streak)
+                VALUES (?, ?, ?, 0, 0)
+            """, (habit_id, record_date, status))
+            record_id = cursor.lastrowid
+            inserted_ids.append(record_id)
+            result["result"] = "inserted"
+
+        result["record_id"] = record_id
+        if result["result"] != "unchanged":
+            affected[habit_id] = min(record_date, affected.get(habit_id, record_date))
+        if key:
+            cursor.execute("""
+                INSERT INTO sync_keys (idempotency_key, record_id) VALUES (?, ?)
+            """, (key, record_id))
+
+    for habit_id, from_date in affected.items():
+        updated_ids.update(_recalculate_streaks(cursor, habit_id, from_date))
+
+    # Log after recalculation so the snapshots carry the final streaks
+    for record_id in inserted_ids:
+        _log_change(cursor, "record", record_id, "insert")
+    for record_id in sorted(updated_ids.difference(inserted_ids)):
+        _log_change(cursor, "record", record_id, "update")
+
+    conn.commit()
+    conn.close()
+    notifier.notify()
+    return results
+
 # Delete a habit record by its ID
 def delete_record(record_id):
+    """
+        Deletes a habit record and recalculates the streaks of the records after it.
+        Args:
+            record_id (int): The ID of the record to delete.
+    """
     conn = get_connection()
     cursor = conn.cursor()
+    cursor.execute("""
+        SELECT habit_id, date FROM habit_records WHERE id = ?
+    """, (record_id,))
+    record = cursor.fetchone()
     cursor.execute("""
         DELETE FROM habit_records WHERE id = ?
     """, (record_id,))
+    if record:
+        _log_change(cursor, "record", record_id, "delete")
+        for updated_id in _recalculate_streaks(cursor, record["habit_id"], record["date"]):
+            _log_change(cursor, "record", updated_id, "update")
+    conn.commit()
+    conn.close()
+    notifier.notify()
+
+# =====================
+# Change Feed
+# =====================
+
+# Retrieve a page of changes logged after a given sequence number
+def get_change_page(since=0, limit=500):
+    """
+        Retrieves change log entries with a sequence number greater than `since`.
+        The log bounds and the page are read in one transaction, so a compaction
+        committed by a concurrent write cannot slip in between the staleness check
+        and the page.
+        Args:
+            since (int): The last sequence number the client has already applied.
+            limit (int): The maximum number of changes to return.
+        Returns:
+            dict: 'changes' (oldest first), 'last_seq' (the cursor for the next call),
+                'has_more', and 'resync_required', which is True when changes after `since`
+                were compacted away. The page then starts at the oldest retained change.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'")
+    latest = cursor.fetchone()
+    cursor.execute("SELECT MIN(seq) AS oldest_seq FROM changes")
+    oldest = cursor.fetchone()
+
+    latest_seq = latest["seq"] if latest else 0
+    # An empty log after compaction still needs every earlier cursor to resync
+    oldest_seq = oldest["oldest_seq"] if oldest["oldest_seq"] is not None else latest_seq + 1
+    resync_required = since < oldest_seq - 1
+    if resync_required:
+        since = oldest_seq - 1
+
+    cursor.execute("""
+        SELECT * FROM changes WHERE seq > ? ORDER BY seq LIMIT ?
+    """, (since, limit))
+    changes = cursor.fetchall()
+    conn.commit()
+    conn.close()
+
+    result = []
+    for change in changes:
+        change = dict(change)
+        change["data"] = json.loads(change["data"]) if change["data"] else None
+        result.append(change)
+
+    last_seq = result[-1]["seq"] if result else max(since, latest_seq)
+    return {
+        "changes": result,
+        "last_seq": last_seq,
+        "has_more": last_seq < latest_seq,
+        "resync_required": resync_required,
+    }
+
+# Compact the change log and expire sync idempotency keys
+def compact_changes(retention_days=CHANGES_RETENTION_DAYS):
+    """
+        Deletes change log entries older than the retention window, and sync
+        idempotency keys older than SYNC_KEYS_RETENTION_DAYS.
+        Args:
+            retention_days (int): The number of days of changes to keep.
+        Returns:
+            int: The number of deleted change log entries.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    deleted = _compact_changes(cursor, retention_days)
     conn.commit()
     conn.close()
+    return deleted
@@ -22,6 +22,8 @@ def init_db():
         Tables:
             - habits: Stores habit information.
             - habit_records: Tracks individual records for each habit, including streak data.
+            - changes: Append-only log of writes to habits and records, used for incremental sync.
+            - sync_keys: Idempotency keys of records uploaded through the sync endpoint.
         """
     conn = get_connection()
     cursor = conn.cursor()
@@ -50,6 +52,39 @@ def init_db():
         )
     """)
 
+    # Create the 'changes' table to log every write with a monotonically increasing sequence
+    # 'data' holds a JSON snapshot of the row after the write (NULL for deletes)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT CHECK(entity IN ('habit', 'record')) NOT NULL,
+            entity_id INTEGER NOT NULL,
+            op TEXT CHECK(op IN ('insert', 'update', 'delete')) NOT NULL,
+            data TEXT,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_changes_changed_at ON changes (changed_at)
+    """)
+
+    # Create the 'sync_keys' table so replayed offline uploads are applied only once
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_keys (
+            idempotency_key TEXT PRIMARY KEY,
+            record_id INTEGER NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sync_keys_applied_at ON sync_keys (applied_at)
+    """)
+
+    # Index records by habit and date for sync deduplication and streak recalculation
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_habit_records_habit_date ON habit_records (habit_id, date)
+    """)
+
     conn.commit() # Save changes to the database
     conn.close() # Close the database connection
 
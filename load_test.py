@@ -0,0 +1,162 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+# =====================
+# Write Storm Load Test
+# =====================
+# Measures read latency against a running server in three phases:
+#   1. Baseline: reads only.
+#   2. Write storm: writer threads flood POST /api/records from one client address,
+#      so the per-client token bucket rejects most of them with 429.
+#   3. Saturation: each writer sends from its own loopback address (127.0.0.2, 127.0.0.3, ...),
+#      so writes get past the token buckets and hit the concurrency limit and write queue,
+#      which reject the excess with 503.
+# With admission control, read latency should stay close to the baseline in every phase.
+# Linux routes all of 127.0.0.0/8 to loopback; elsewhere, start the server with a high
+# HABIT_TRACKER_WRITE_RATE and HABIT_TRACKER_WRITE_BURST and run with --same-address.
+#
+# Usage:
+#   uvicorn main:app
+#   python load_test.py --url http://127.0.0.1:8000 --writers 16 --saturation-writers 64 --duration 10
+
+def request(method, url, source=None):
+    """
+        Sends a request and returns its status code.
+        Args:
+            method (str): The HTTP method.
+            url (str): The full URL.
+            source (str, optional): The local address to send from.
+        Returns:
+            int or str: The HTTP status code, or 'error' if the connection failed.
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+    body = json.dumps({"status": "completed"}) if method == "POST" else None
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30,
+                                      source_address=(source, 0) if source else None)
+    try:
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    except (OSError, http.client.HTTPException):
+        # Connection refused or reset, timeouts and malformed responses
+        return "error"
+    finally:
+        conn.close()
+
+def measure_reads(url, duration):
+    """
+        Sends read requests back to back for a fixed time.
+        Args:
+            url (str): The URL to read.
+            duration (float): Seconds to keep reading.
+        Returns:
+            list: The latency of each read in milliseconds.
+    """
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        request("GET", url)
+        latencies.append((time.monotonic() - started) * 1000)
+    return latencies
+
+def flood_writes(url, source, stop, statuses, lock):
+    """
+        Sends write requests back to back until `stop` is set.
+        Args:
+            url (str): The URL to post records to.
+            source (str): The local address to send from, or None for the default.
+            stop (threading.Event): Set when the phase is over.
+            statuses (Counter): Shared count of response statuses.
+            lock (threading.Lock): Guards `statuses`.
+    """
+    while not stop.is_set():
+        status = request("POST", url, source)
+        with lock:
+            statuses[status] += 1
+
+def run_phase(read_url, write_url, sources, duration):
+    """
+        Measures reads while one writer thread per source floods writes.
+        Args:
+            read_url (str): The URL to read.
+            write_url (str): The URL to post records to.
+            sources (list): The local address of each writer thread (None for the default).
+            duration (float): Seconds to run the phase.
+        Returns:
+            tuple: (read latencies in milliseconds, Counter of write statuses).
+    """
+    stop = threading.Event()
+    statuses = Counter()
+    lock = threading.Lock()
+    writers = [threading.Thread(target=flood_writes, args=(write_url, source, stop, statuses, lock))
+               for source in sources]
+    for writer in writers:
+        writer.start()
+    try:
+        latencies = measure_reads(read_url, duration)
+    finally:
+        stop.set()
+        for writer in writers:
+            writer.join()
+    return latencies, statuses
+
+def summarize(latencies):
+    """
+        Formats latency percentiles.
+        Args:
+            latencies (list): Latencies in milliseconds.
+        Returns:
+            str: A one-line summary.
+    """
+    samples = sorted(latencies)
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+    return (f"{len(samples)} reads, p50 {percentile(0.50):.1f} ms, "
+            f"p95 {percentile(0.95):.1f} ms, p99 {percentile(0.99):.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure read latency during write storms.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running API")
+    parser.add_argument("--writers", type=int, default=16, help="Writer threads in the write storm phase")
+    parser.add_argument("--saturation-writers", type=int, default=64, help="Writer threads in the saturation phase")
+    parser.add_argument("--same-address", action="store_true",
+                        help="Send saturation writes from the default address instead of one loopback address each")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per phase")
+    parser.add_argument("--habit-id", type=int, default=1, help="Habit to post records for")
+    args = parser.parse_args()
+
+    read_url = f"{args.url}/api/habits/"
+    write_url = f"{args.url}/api/records?habit_id={args.habit_id}"
+
+    print("Baseline:          ", summarize(measure_reads(read_url, args.duration)))
+
+    latencies, statuses = run_phase(read_url, write_url, [None] * args.writers, args.duration)
+    print("Write storm:       ", summarize(latencies))
+    print("  write statuses:  ", dict(sorted(statuses.items(), key=str)))
+
+    if args.same_address:
+        sources = [None] * args.saturation_writers
+    else:
+        sources = [f"127.0.{(i + 2) // 256}.{(i + 2) % 256}" for i in range(args.saturation_writers)]
+    latencies, statuses = run_phase(read_url, write_url, sources, args.duration)
+    print("Saturation:        ", summarize(latencies))
+    print("  write statuses:  ", dict(sorted(statuses.items(), key=str)))
+
+    parts = urllib.parse.urlsplit(args.url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    conn.request("GET", "/api/metrics")
+    print("Admission:         ", json.dumps(json.loads(conn.getresponse().read())["admission"]))
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 from fastapi import FastAPI
-from routes import habits, records
+from routes import habits, records, changes, metrics
 from database import init_db
+import admission
+import crud
+import replica
 
 # Create the FastAPI application instance
 app = FastAPI()
@@ -9,11 +12,28 @@ app = FastAPI()
 # Ensures that the necessary tables are created if they don't exist
 init_db()
 
+# Drop change log entries and sync idempotency keys that have aged out of their retention windows
+crud.compact_changes()
+
+# Take the first read snapshot and keep refreshing it in the background (when snapshot mode is on)
+# Heavy list and aggregate reads are then served from it instead of competing with writes
+replica.start()
+
+# Apply admission control to write requests
+# Each client is rate limited by a token bucket and only a few writes run at once, so a
+# flood of writes is rejected quickly with 429/503 instead of queueing on SQLite's writer lock
+# Reads pass through untouched
+app.add_middleware(admission.AdmissionMiddleware)
+
 # Include the routes for habits and habit records
 # All routes related to habits will be prefixed with '/api' and tagged as 'habits'
 # All routes related to habit records will be prefixed with '/api' and tagged as 'habit_records'
+# The change feed used for incremental sync will be prefixed with '/api' and tagged as 'changes'
+# Operational metrics will be prefixed with '/api' and tagged as 'metrics'
 app.include_router(habits.router, prefix="/api", tags=["habits"])
 app.include_router(records.router, prefix="/api", tags=["habit_records"])
+app.include_router(changes.router, prefix="/api", tags=["changes"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 
 # Define the root endpoint
 # This is a simple health check or welcome message for the API
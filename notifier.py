@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+# =====================
+# Change Notifier
+# =====================
+# Writes commit on threadpool threads while change streams wait on the event loop,
+# so each stream registers an asyncio.Event that writers set thread-safely.
+
+_lock = threading.Lock()
+_subscribers = set()  # (loop, asyncio.Event) pairs of open change streams
+
+def subscribe():
+    """
+        Registers the calling coroutine's stream for change notifications.
+        Must be called from a running event loop.
+        Returns:
+            asyncio.Event: An event that is set whenever a write commits.
+    """
+    event = asyncio.Event()
+    with _lock:
+        _subscribers.add((asyncio.get_running_loop(), event))
+    return event
+
+def unsubscribe(event):
+    """
+        Stops notifying a stream.
+        Args:
+            event (asyncio.Event): The event returned by subscribe().
+    """
+    with _lock:
+        _subscribers.difference_update({pair for pair in _subscribers if pair[1] is event})
+
+def notify():
+    """
+        Wakes every subscribed stream. Safe to call from any thread after a write commits.
+    """
+    with _lock:
+        subscribers = list(_subscribers)
+    for loop, event in subscribers:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # The loop has been closed; its stream is gone
+            unsubscribe(event)
@@ -0,0 +1,276 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from database import get_connection
+
+# Where heavy reads are served from:
+# 'off' reads the primary database, 'file' a replica file and 'memory' an in-memory snapshot
+SNAPSHOT_MODE = os.environ.get("HABIT_TRACKER_SNAPSHOT_MODE", "off")
+if SNAPSHOT_MODE not in ("off", "file", "memory"):
+    raise ValueError(f"HABIT_TRACKER_SNAPSHOT_MODE must be 'off', 'file' or 'memory', not {SNAPSHOT_MODE!r}")
+
+# Name of the SQLite replica file used in 'file' mode
+REPLICA_NAME = "habit_tracker_replica.db"
+
+# URI of the snapshot used in 'memory' mode, formatted with the snapshot generation
+# The memdb VFS shares a named in-memory database between connections in this process
+MEMORY_SNAPSHOT_URI = "file:/habit_tracker_snapshot_{generation}?vfs=memdb"
+
+# Seconds between background refreshes of the snapshot
+REFRESH_INTERVAL = float(os.environ.get("HABIT_TRACKER_SNAPSHOT_REFRESH", 5))
+
+# Maximum age in seconds of the snapshot a read may see
+# If the background refresh falls behind, the next read refreshes it first
+MAX_STALENESS = float(os.environ.get("HABIT_TRACKER_SNAPSHOT_MAX_STALENESS", 30))
+
+# Number of idle read-only connections kept open
+READ_POOL_SIZE = 4
+
+# =====================
+# Read-only Connection Pool
+# =====================
+
+_pool = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+
+class _PooledConnection(sqlite3.Connection):
+    """
+       A read-only snapshot connection that returns itself to the pool when closed,
+       so callers can use it exactly like a connection from get_connection().
+       Connections to a replaced in-memory snapshot are closed instead, which frees it.
+    """
+    generation = 0  # The snapshot generation this connection reads
+
+    def close(self):
+        if self.generation == _generation:
+            try:
+                _pool.put_nowait(self)
+                return
+            except queue.Full:
+                pass
+        super().close()
+
+def _open_reader():
+    """
+        Opens a read-only connection to the snapshot.
+        Returns:
+            sqlite3.Connection: A connection that rejects writes.
+    """
+    if SNAPSHOT_MODE == "memory":
+        # Hold the refresh lock so the snapshot cannot be replaced and freed while connecting
+        with _refresh_lock:
+            generation = _generation
+            uri = MEMORY_SNAPSHOT_URI.format(generation=generation) + "&mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=_PooledConnection)
+    else:
+        generation = _generation
+        uri = Path(REPLICA_NAME).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=_PooledConnection)
+    conn.generation = generation
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def _drain_pool():
+    """
+        Closes the idle pooled connections, so new reads open connections to the current snapshot.
+    """
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            return
+        sqlite3.Connection.close(conn)
+
+def _snapshot_fresh():
+    """
+        Checks whether a snapshot exists and is within MAX_STALENESS.
+        Returns:
+            bool: True if reads may be served from the snapshot.
+    """
+    return _stats["last_refresh"] is not None and time.time() - _stats["last_refresh"] <= MAX_STALENESS
+
+def get_read_connection():
+    """
+        Retrieves a connection for read-only queries that may lag behind the primary.
+        If the snapshot is older than MAX_STALENESS and cannot be refreshed, or no snapshot
+        has been taken yet, the read is served from the primary.
+        Returns:
+            sqlite3.Connection: A pooled snapshot connection, or a primary connection when snapshot mode is off.
+    """
+    if SNAPSHOT_MODE == "off":
+        return get_connection()
+
+    if not _snapshot_fresh():
+        try:
+            refresh(forced=True)
+        except sqlite3.Error:
+            # Already counted in failed_refreshes; a failed refresh should not fail the read
+            pass
+    if not _snapshot_fresh():
+        return get_connection()
+
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        return _open_reader()
+    except sqlite3.Error:
+        return get_connection()
+
+def get_read_seq():
+    """
+        Retrieves a change log sequence number that reads from get_read_connection() are at least as new as.
+        Call it before running the read: a client that reloads its lists and then resumes the change
+        feed from this number may see some changes twice, but never misses one.
+        Returns:
+            int: The snapshot's sequence number, or the primary's when reads are served from the primary.
+    """
+    if SNAPSHOT_MODE != "off" and _snapshot_fresh():
+        return _stats["replica_seq"]
+    conn = get_connection()
+    seq = _latest_seq(conn)
+    conn.close()
+    return seq
+
+# =====================
+# Snapshot Refresh
+# =====================
+
+_refresh_lock = threading.Lock()
+
+# The in-memory snapshot only lives while a connection to it stays open
+_memory_holder = None
+
+# Incremented each time a new in-memory snapshot replaces the previous one
+_generation = 0
+
+_stats = {
+    "refreshes": 0,
+    "forced_refreshes": 0,
+    "failed_refreshes": 0,
+    "last_refresh": None,
+    "last_refresh_duration_ms": None,
+    "replica_seq": 0,
+}
+
+def _latest_seq(conn):
+    """
+        Retrieves the latest change log sequence number of a database.
+        Args:
+            conn (sqlite3.Connection): The connection to query.
+        Returns:
+            int: The sequence number, or 0 if nothing has been logged.
+    """
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row else 0
+
+def refresh(forced=False):
+    """
+        Copies the primary database into the snapshot with SQLite's online backup API.
+        Args:
+            forced (bool): Whether the refresh was triggered by a read exceeding MAX_STALENESS.
+    """
+    global _memory_holder, _generation
+
+    with _refresh_lock:
+        # Another thread may have refreshed while this one waited for the lock
+        if forced and _snapshot_fresh():
+            return
+
+        started = time.monotonic()
+        source = target = None
+        try:
+            source = get_connection()
+            if SNAPSHOT_MODE == "memory":
+                # Copy into a new in-memory database that no reader holds a lock on yet
+                uri = MEMORY_SNAPSHOT_URI.format(generation=_generation + 1)
+                target = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            else:
+                target = sqlite3.connect(REPLICA_NAME)
+
+            # Copy all pages in one step; the primary is small, and copying in steps would
+            # restart the backup every time a write lands in between
+            source.backup(target)
+            replica_seq = _latest_seq(target)
+        except sqlite3.Error:
+            _stats["failed_refreshes"] += 1
+            if target is not None:
+                target.close()
+            raise
+        finally:
+            if source is not None:
+                source.close()
+
+        if SNAPSHOT_MODE == "memory":
+            # Swap in the new snapshot; readers still on the old one free it once they close
+            previous, _memory_holder = _memory_holder, target
+            _generation += 1
+            _drain_pool()
+            if previous is not None:
+                previous.close()
+        else:
+            target.close()
+
+        _stats["refreshes"] += 1
+        _stats["forced_refreshes"] += forced
+        _stats["last_refresh"] = time.time()
+        _stats["last_refresh_duration_ms"] = round((time.monotonic() - started) * 1000, 3)
+        _stats["replica_seq"] = replica_seq
+
+def _refresh_loop():
+    """
+        Refreshes the snapshot every REFRESH_INTERVAL seconds until the process exits.
+    """
+    while True:
+        try:
+            refresh()
+        except sqlite3.Error:
+            # Keep serving the previous snapshot; the failure is counted in failed_refreshes
+            pass
+        time.sleep(REFRESH_INTERVAL)
+
+def start():
+    """
+        Takes the first snapshot and starts refreshing it in the background.
+        Does nothing when snapshot mode is off.
+    """
+    if SNAPSHOT_MODE == "off":
+        return
+    refresh()
+    threading.Thread(target=_refresh_loop, name="snapshot-refresh", daemon=True).start()
+
+# =====================
+# Metrics
+# =====================
+
+def metrics():
+    """
+        Retrieves snapshot refresh statistics and how far the snapshot lags the primary.
+        Returns:
+            dict: Replica metrics.
+    """
+    result = {"mode": SNAPSHOT_MODE, "max_staleness_seconds": MAX_STALENESS}
+    if SNAPSHOT_MODE == "off":
+        return result
+
+    conn = get_connection()
+    primary_seq = _latest_seq(conn)
+    conn.close()
+
+    last_refresh = _stats["last_refresh"]
+    result.update(
+        refreshes=_stats["refreshes"],
+        forced_refreshes=_stats["forced_refreshes"],
+        failed_refreshes=_stats["failed_refreshes"],
+        last_refresh_duration_ms=_stats["last_refresh_duration_ms"],
+        lag_seconds=round(time.time() - last_refresh, 3) if last_refresh is not None else None,
+        primary_seq=primary_seq,
+        replica_seq=_stats["replica_seq"],
+        lag_changes=primary_seq - _stats["replica_seq"],
+    )
+    return result
@@ -0,0 +1,87 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from schemas import ChangeFeed
+import crud
+import notifier
+
+# Initialize a router for change feed endpoints
+router = APIRouter()
+
+# Seconds an idle stream waits for a write notification before it checks anyway
+# and sends a keep-alive comment so proxies keep the stream open
+STREAM_FALLBACK_INTERVAL = 15.0
+
+# =====================
+# Change Feed Endpoints
+# =====================
+
+@router.get("/changes", response_model=ChangeFeed)
+def get_changes(since: int = 0, limit: int = Query(500, ge=1, le=5000)):
+    """
+    Retrieve the changes made after a given sequence number.
+    Clients store `last_seq` from the response and pass it as `since` on the next call,
+    so each poll only transfers what changed instead of the full lists.
+    Args:
+        since (int): The last sequence number the client has already applied.
+        limit (int): The maximum number of changes to return.
+    Returns:
+        ChangeFeed: The changes, the cursor for the next call, and whether more are pending.
+    Raises:
+        HTTPException: If the requested changes have been compacted away (410). The client
+            then reloads GET /habits/ and GET /records and resumes from their X-Snapshot-Seq
+            header (the lower of the two), since those lists may be served from a snapshot
+            that lags the change log.
+    """
+    page = crud.get_change_page(since, limit)
+    if page["resync_required"]:
+        raise HTTPException(status_code=410, detail="Changes since this sequence were compacted, a full resync is required")
+    return page
+
+@router.get("/changes/stream")
+async def stream_changes(request: Request, since: int = 0, last_event_id: Optional[int] = Header(None)):
+    """
+    Stream changes to the client as server-sent events.
+    Each change is sent as a 'change' event whose id is its sequence number, so a
+    reconnecting EventSource resumes from the Last-Event-ID header automatically.
+    The stream only queries the change log when a write commits in this process,
+    with a slow fallback check every STREAM_FALLBACK_INTERVAL seconds.
+    Args:
+        since (int): The last sequence number the client has already applied.
+        last_event_id (Optional[int]): The Last-Event-ID header, which takes precedence over `since`.
+    Returns:
+        StreamingResponse: A text/event-stream response.
+    """
+    cursor = last_event_id if last_event_id is not None else since
+
+    async def event_stream():
+        last_seq = cursor
+        written = notifier.subscribe()
+        try:
+            while not await request.is_disconnected():
+                # Clear before querying so a write committed during the query still wakes the stream
+                written.clear()
+                page = await run_in_threadpool(crud.get_change_page, last_seq)
+                if page["resync_required"]:
+                    # The client has missed compacted changes and must reload its lists,
+                    # then reconnect with since set to the lists' X-Snapshot-Seq header
+                    yield "event: resync\ndata: {}\n\n"
+                changes = page["changes"]
+                last_seq = page["last_seq"]
+                for change in changes:
+                    yield f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+                if changes:
+                    continue
+
+                try:
+                    await asyncio.wait_for(written.wait(), STREAM_FALLBACK_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            notifier.unsubscribe(written)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
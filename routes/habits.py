@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from schemas import Habit, HabitCreate, HabitUpdate
 import crud
+import replica
 
 # Initialize a router for habit-related endpoints
 router = APIRouter()
@@ -21,12 +22,15 @@ def create_habit(habit: HabitCreate):
     return habit_id
 
 @router.get("/habits/", response_model=list[Habit])
-def list_habits():
+def list_habits(response: Response):
     """
         Retrieves a list of all habits.
+        The X-Snapshot-Seq header holds the change sequence the list is at least as new as;
+        a client reloading after a resync resumes the change feed from it.
         Returns:
             list: A list of Habit objects.
     """
+    response.headers["X-Snapshot-Seq"] = str(replica.get_read_seq())
     return crud.get_all_habits()
 
 @router.get("/habits/by-frequency", response_model=list[Habit])
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+import admission
+import replica
+
+# Initialize a router for operational metrics endpoints
+router = APIRouter()
+
+# =====================
+# Metrics Endpoints
+# =====================
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Retrieve operational metrics for the API.
+    Returns:
+        dict: Admission control counters, write queue times and read snapshot lag.
+    """
+    return {"admission": admission.controller.metrics(), "replica": replica.metrics()}
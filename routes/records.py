@@ -1,10 +1,14 @@
-from fastapi import APIRouter, HTTPException, Query
-from schemas import HabitRecordCreate, HabitRecord, Habit
+from fastapi import APIRouter, HTTPException, Query, Response
+from schemas import HabitRecordCreate, HabitRecord, Habit, SyncRequest, SyncResponse
 import crud
+import replica
 
 # Initialize a router for record-related endpoints
 router = APIRouter()
 
+# Maximum number of records accepted in a single sync upload
+SYNC_MAX_BATCH = 1000
+
 # ==============================
 # Routes for Habit Records
 # ==============================
@@ -22,18 +26,44 @@ def create_record(habit_id: int, record: HabitRecordCreate):
     record_id = crud.create_record(habit_id, record.status)
     return record_id
 
+@router.post("/records/sync", response_model=SyncResponse)
+def sync_records(sync: SyncRequest):
+    """
+    Apply a batch of records created offline and return the server changes in the same round-trip.
+    Records keep their client-side dates, are deduplicated by idempotency key and by
+    (habit_id, date), and streaks are recalculated once per affected habit.
+    Args:
+        sync (SyncRequest): The client's last applied change sequence and its pending records.
+    Returns:
+        SyncResponse: The outcome of each record and the changes after the client's last_seq.
+    Raises:
+        HTTPException: If the batch is larger than SYNC_MAX_BATCH.
+    """
+    if len(sync.records) > SYNC_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"A sync batch may contain at most {SYNC_MAX_BATCH} records")
+
+    results = crud.sync_records([
+        {**record.dict(), "date": record.date.isoformat()} for record in sync.records
+    ])
+
+    return {"results": results, **crud.get_change_page(sync.last_seq)}
+
 @router.get("/records", response_model=list[HabitRecord])
-def get_all_records():
+def get_all_records(response: Response):
     """
     Retrieve all habit records.
+    The X-Snapshot-Seq header holds the change sequence the list is at least as new as;
+    a client reloading after a resync resumes the change feed from it.
     Returns:
         list: A list of all habit records.
     Raises:
         HTTPException: If no records are found.
     """
+    snapshot_seq = replica.get_read_seq()
     records = crud.get_all_records()
     if not records:
-        raise HTTPException(status_code=404, detail="No records found")
+        raise HTTPException(status_code=404, detail="No records found", headers={"X-Snapshot-Seq": str(snapshot_seq)})
+    response.headers["X-Snapshot-Seq"] = str(snapshot_seq)
     return records
 
 @router.get("/records/streaks/longest", response_model=int)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
+import datetime
 
 # =====================
 # Schemas for Habits
@@ -86,4 +87,99 @@ class HabitRecord(BaseModel):
         """
         Configuration for Pydantic model to enable ORM compatibility.
         """
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+# =====================
+# Schemas for the Change Feed
+# =====================
+
+class Change(BaseModel):
+    """
+    Schema for an entry in the change log.
+    Attributes:
+        seq (int): The monotonically increasing sequence number of the change.
+        entity (str): The kind of row that changed ('habit' or 'record').
+        entity_id (int): The ID of the row that changed.
+        op (str): The kind of change ('insert', 'update' or 'delete').
+        data (Optional[dict]): The row as written, or None for deletes.
+        changed_at (str): The time the change was logged.
+    """
+    seq: int
+    entity: str
+    entity_id: int
+    op: str
+    data: Optional[dict]
+    changed_at: str
+
+class ChangeFeed(BaseModel):
+    """
+    Schema for a page of the change feed.
+    Attributes:
+        changes (list[Change]): The changes after the requested sequence number, oldest first.
+        last_seq (int): The sequence number to pass as `since` on the next request.
+        has_more (bool): Whether more changes are available beyond this page.
+    """
+    changes: list[Change]
+    last_seq: int
+    has_more: bool
+
+# =====================
+# Schemas for Offline Sync
+# =====================
+
+class SyncRecord(BaseModel):
+    """
+    Schema for a record created on a client while offline.
+    Attributes:
+        habit_id (int): The ID of the associated habit.
+        date (datetime.date): The client-side date the habit was tracked on.
+        status (str): The status of the habit record ('completed' or 'missed').
+        idempotency_key (Optional[str]): A client-generated key so replays are applied only once.
+    """
+    habit_id: int
+    date: datetime.date
+    status: str  # 'completed' or 'missed'
+    idempotency_key: Optional[str] = None
+
+class SyncRequest(BaseModel):
+    """
+    Schema for a batched sync upload.
+    Attributes:
+        last_seq (int): The last change feed sequence number the client has applied.
+        records (list[SyncRecord]): The records created on the client since its last sync.
+    """
+    last_seq: int = 0
+    records: list[SyncRecord] = []
+
+class SyncResult(BaseModel):
+    """
+    Schema for the outcome of one uploaded record.
+    Attributes:
+        idempotency_key (Optional[str]): The key sent with the record, if any.
+        habit_id (int): The ID of the associated habit.
+        date (str): The date of the record.
+        result (str): 'inserted', 'updated', 'unchanged', 'duplicate' or 'rejected'.
+        record_id (Optional[int]): The ID of the server-side record, or None if rejected.
+    """
+    idempotency_key: Optional[str]
+    habit_id: int
+    date: str
+    result: str
+    record_id: Optional[int]
+
+class SyncResponse(BaseModel):
+    """
+    Schema for the response to a sync upload.
+    Attributes:
+        results (list[SyncResult]): The outcome of each uploaded record, in upload order.
+        changes (list[Change]): The server changes after the client's last_seq, including its own.
+        last_seq (int): The sequence number to send as last_seq on the next sync.
+        has_more (bool): Whether more changes are available through the change feed.
+        resync_required (bool): Whether the client missed compacted changes and must reload its lists.
+            After a reload, the next sync sends the lists' X-Snapshot-Seq header as last_seq, not this last_seq.
+    """
+    results: list[SyncResult]
+    changes: list[Change]
+    last_seq: int
+    has_more: bool
+    resync_required: bool
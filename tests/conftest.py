@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Make the application modules importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+@pytest.fixture(autouse=True)
+def temp_db(tmp_path, monkeypatch):
+    """
+    Points the application at a fresh SQLite database for each test.
+    """
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "habit_tracker.db"))
+    database.init_db()
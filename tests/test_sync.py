@@ -0,0 +1,90 @@
+import datetime
+
+import crud
+
+def make_habit():
+    return crud.create_habit("Run", "Morning run", "daily")
+
+def streaks(habit_id):
+    """
+    Returns (date, status, current_streak, longest_streak) for each record of a habit, by date.
+    """
+    records = sorted(crud.get_records_by_habit(habit_id), key=lambda record: (record["date"], record["id"]))
+    return [(r["date"], r["status"], r["current_streak"], r["longest_streak"]) for r in records]
+
+def test_out_of_order_dates_get_chronological_streaks():
+    habit_id = make_habit()
+    results = crud.sync_records([
+        {"habit_id": habit_id, "date": "2024-01-03", "status": "completed"},
+        {"habit_id": habit_id, "date": "2024-01-01", "status": "completed"},
+        {"habit_id": habit_id, "date": "2024-01-02", "status": "missed"},
+        {"habit_id": habit_id, "date": "2024-01-04", "status": "completed"},
+    ])
+
+    assert [result["result"] for result in results] == ["inserted"] * 4
+    assert streaks(habit_id) == [
+        ("2024-01-01", "completed", 1, 1),
+        ("2024-01-02", "missed", 0, 1),
+        ("2024-01-03", "completed", 1, 1),
+        ("2024-01-04", "completed", 2, 2),
+    ]
+
+def test_completed_wins_date_conflict_in_either_order():
+    habit_id = make_habit()
+    crud.sync_records([{"habit_id": habit_id, "date": "2024-01-01", "status": "missed"}])
+    results = crud.sync_records([{"habit_id": habit_id, "date": "2024-01-01", "status": "completed"}])
+    assert results[0]["result"] == "updated"
+
+    results = crud.sync_records([{"habit_id": habit_id, "date": "2024-01-01", "status": "missed"}])
+    assert results[0]["result"] == "unchanged"
+    assert streaks(habit_id) == [("2024-01-01", "completed", 1, 1)]
+
+def test_repeated_idempotency_key_is_applied_once():
+    habit_id = make_habit()
+    record = {"habit_id": habit_id, "date": "2024-01-01", "status": "completed", "idempotency_key": "k1"}
+    first = crud.sync_records([record])
+    replay = crud.sync_records([record, {**record, "date": "2024-01-02"}])
+
+    assert first[0]["result"] == "inserted"
+    assert [result["result"] for result in replay] == ["duplicate", "duplicate"]
+    assert replay[0]["record_id"] == first[0]["record_id"]
+    assert len(crud.get_records_by_habit(habit_id)) == 1
+
+def test_future_date_is_rejected_and_does_not_break_new_records():
+    habit_id = make_habit()
+    results = crud.sync_records([{"habit_id": habit_id, "date": "2099-01-01", "status": "missed"}])
+    assert results[0]["result"] == "rejected"
+
+    crud.create_record(habit_id, "completed")
+    crud.create_record(habit_id, "completed")
+    assert [row[2] for row in streaks(habit_id)] == [1, 2]
+
+def test_record_dated_tomorrow_follows_todays_check_in():
+    habit_id = make_habit()
+    tomorrow = (datetime.datetime.now(datetime.timezone.utc).date() + datetime.timedelta(days=1)).isoformat()
+    results = crud.sync_records([{"habit_id": habit_id, "date": tomorrow, "status": "completed"}])
+    assert results[0]["result"] == "inserted"
+
+    crud.create_record(habit_id, "completed")
+    assert [row[2] for row in streaks(habit_id)] == [1, 2]
+
+def test_unknown_habit_is_rejected():
+    results = crud.sync_records([{"habit_id": 999, "date": "2024-01-01", "status": "completed"}])
+    assert results[0]["result"] == "rejected"
+
+def test_updating_and_deleting_history_recalculates_later_streaks():
+    habit_id = make_habit()
+    results = crud.sync_records([
+        {"habit_id": habit_id, "date": f"2024-01-0{day}", "status": "completed"} for day in (1, 2, 3)
+    ])
+    first_id = results[0]["record_id"]
+
+    crud.update_record(first_id, "missed")
+    assert [row[2] for row in streaks(habit_id)] == [0, 1, 2]
+
+    crud.update_record(first_id, "completed")
+    crud.update_record(first_id, "completed")
+    assert [row[2] for row in streaks(habit_id)] == [1, 2, 3]
+
+    crud.delete_record(results[1]["record_id"])
+    assert [row[2] for row in streaks(habit_id)] == [1, 2]